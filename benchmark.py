@@ -0,0 +1,142 @@
+#  Latency and throughput benchmarks for the send, parse, log and decode paths,
+#  run against virtual_radio.VirtualRadio so no rig is needed.  Run it before and
+#  after touching any of those paths:
+#      python benchmark.py                    unpaced, as fast as the pty goes
+#      python benchmark.py --baud 19200       paced like the real CI-V link
+#      python benchmark.py --noise 0.1 --json
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import civ_frame
+from civ_parser import FrameParser
+from frequency_log import FrequencyLogWriter, FrequencyLogReader
+from radio_session import RadioSession
+from scan import Scan, frequency_range
+from virtual_radio import VirtualRadio
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def bench_round_trip(radio, count):
+    """One command at a time: wait for each reply before sending the next."""
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(count):
+        sent = time.perf_counter()
+        radio.read_frequency().result()
+        latencies.append(time.perf_counter() - sent)
+    elapsed = time.perf_counter() - started
+    return {"commands_per_second": count / elapsed,
+            "p50_ms": percentile(latencies, .5) * 1000,
+            "p99_ms": percentile(latencies, .99) * 1000}
+
+
+def bench_pipelined(radio, count):
+    """Everything queued up front; the session sends each as the last reply lands."""
+    started = time.perf_counter()
+    futures = [radio.read_frequency() for _ in range(count)]
+    for future in futures:
+        future.result()
+    return {"commands_per_second": count / (time.perf_counter() - started)}
+
+
+def bench_scan(radio, count):
+    scan = Scan(radio, frequency_range(7000000, 7000000 + (count - 1) * 1000, 1000)).run()
+    return {"steps_per_second": scan.steps_per_second, "failed": sum(not result.ok for result in scan.results)}
+
+
+def bench_parser(count):
+    reply = civ_frame.build_frame(civ_frame.READ_FREQUENCY, civ_frame.encode_frequency(14074000),
+                                  civ_frame.CONTROLLER_ADDRESS, civ_frame.DEFAULT_ADDRESS)
+    data = (civ_frame.read_frequency_frame() + reply) * count
+    parser = FrameParser()
+    started = time.perf_counter()
+    frames = 0
+    for offset in range(0, len(data), 64):  # roughly what a serial read hands back
+        frames += len(parser.feed(data[offset:offset + 64]))
+    return {"frames_per_second": frames / (time.perf_counter() - started)}
+
+
+def bench_log(directory, count):
+    path = os.path.join(directory, "bench.civlog")
+    frame = civ_frame.set_frequency_frame(14074000)
+    now = time.time()
+    started = time.perf_counter()
+    with FrequencyLogWriter(path) as log:
+        for index in range(count):
+            log.append(14074000 + index, frame, now + index)
+    write_elapsed = time.perf_counter() - started
+    with FrequencyLogReader(path) as reader:
+        started = time.perf_counter()
+        queries = 1000
+        for index in range(queries):
+            start = now + index * count // queries
+            next(reader.between(start, start + 10), None)
+        query_elapsed = time.perf_counter() - started
+    return {"records_per_second": count / write_elapsed,
+            "megabytes_per_second": os.path.getsize(path) / write_elapsed / 1e6,
+            "range_query_us": query_elapsed / queries * 1e6}
+
+
+def bench_decode(directory, count):
+    try:
+        import decode_frequency
+    except ImportError:  # numpy missing
+        return {"skipped": "numpy is not installed"}
+    path = os.path.join(directory, "bench.csv")
+    row = "%s,%s\r\r\n" % (datetime(2021, 2, 15, 12, 8, 43, 278841),
+                           "".join("/ " + hex(byte) for byte in civ_frame.read_frequency_frame()
+                                   + civ_frame.build_frame(civ_frame.READ_FREQUENCY, civ_frame.encode_frequency(3956000),
+                                                           civ_frame.CONTROLLER_ADDRESS, civ_frame.DEFAULT_ADDRESS)))
+    with open(path, "w", newline="") as csv_file:
+        csv_file.write(row * count)
+    started = time.perf_counter()
+    _, hz = decode_frequency.read_log(path)
+    elapsed = time.perf_counter() - started
+    return {"rows_per_second": len(hz) / elapsed, "megabytes_per_second": os.path.getsize(path) / elapsed / 1e6}
+
+
+def run(count=2000, baudrate=None, noise=0.0, log_count=200000, decode_count=200000):
+    results = {"settings": {"count": count, "baud": baudrate, "noise": noise}}
+    with VirtualRadio(baudrate=baudrate, noise=noise, seed=1) as virtual:
+        with RadioSession(virtual.port) as session:
+            radio = session.radio(virtual.address)
+            results["round_trip"] = bench_round_trip(radio, count)
+            results["pipelined"] = bench_pipelined(radio, count)
+            results["scan"] = bench_scan(radio, count)
+    results["parser"] = bench_parser(count * 10)
+    with tempfile.TemporaryDirectory() as directory:
+        results["log_write"] = bench_log(directory, log_count)
+        results["decode"] = bench_decode(directory, decode_count)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CI-V latency and throughput benchmarks against a virtual IC-7300")
+    parser.add_argument("--count", type=int, default=2000, help="radio commands per benchmark")
+    parser.add_argument("--baud", type=int, default=None, help="pace the virtual radio to this baud rate")
+    parser.add_argument("--noise", type=float, default=0.0, help="chance of garbage before each reply")
+    parser.add_argument("--log-count", type=int, default=200000, help="records for the log benchmark")
+    parser.add_argument("--decode-count", type=int, default=200000, help="csv rows for the decode benchmark")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    arguments = parser.parse_args(argv)
+    results = run(arguments.count, arguments.baud, arguments.noise, arguments.log_count, arguments.decode_count)
+    if arguments.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+    for name, values in results.items():
+        print("%-12s %s" % (name, "  ".join("%s=%s" % (key, "%.1f" % value if isinstance(value, float) else value)
+                                            for key, value in values.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#  CI-V frame codec: builds ready-to-write bytes frames for the IC-7300.
+#  A frame is FE FE <to> <from> <command> [<data>...] FD.  Frequencies travel as
+#  5 bytes of packed BCD, least significant pair of digits first, so 3.956 MHz
+#  (0003956000 Hz) is 00 60 95 03 00.
+PREAMBLE = 0xfe
+END = 0xfd
+CONTROLLER_ADDRESS = 0xe0
+DEFAULT_ADDRESS = 0x94  # IC-7300 factory default
+
+SET_FREQUENCY_TRANSCEIVE = 0x00
+READ_FREQUENCY = 0x03
+SET_FREQUENCY = 0x05
+READ_METER = 0x15
+S_METER = 0x02  # sub command of READ_METER
+OK = 0xfb
+NG = 0xfa
+READ_COMMANDS = (READ_FREQUENCY, READ_METER)  # commands that leave the radio's state alone
+NO_REPLY_COMMANDS = (SET_FREQUENCY_TRANSCEIVE,)  # the radio acts on these without answering
+
+FREQUENCY_BYTES = 5
+MAX_FREQUENCY = 10 ** (2 * FREQUENCY_BYTES) - 1
+
+#  _BCD[n] is the packed BCD byte for 0 <= n < 100, _BCD4[n] the two bytes for
+#  0 <= n < 10000 (low pair first), so a frequency is three table lookups
+_BCD = bytes((n // 10) << 4 | n % 10 for n in range(100))
+_BCD4 = [bytes((_BCD[n % 100], _BCD[n // 100])) for n in range(10000)]
+#  reverse table, -1 marks bytes that are not valid BCD
+_FROM_BCD = [-1] * 256
+for _n in range(100):
+    _FROM_BCD[_BCD[_n]] = _n
+del _n
+
+
+def encode_frequency(hz):
+    """Return the 5-byte little-endian BCD field for a frequency in Hz."""
+    hz = int(hz)
+    if not 0 <= hz <= MAX_FREQUENCY:
+        raise ValueError("frequency out of range: %r" % hz)
+    return _BCD4[hz % 10000] + _BCD4[hz // 10000 % 10000] + _BCD[hz // 100000000:hz // 100000000 + 1]
+
+
+def decode_frequency(data):
+    """Return the frequency in Hz held in a 5-byte BCD field."""
+    hz = 0
+    for byte in reversed(bytes(data[:FREQUENCY_BYTES])):
+        pair = _FROM_BCD[byte]
+        if pair < 0:
+            raise ValueError("not a BCD frequency: %s" % bytes(data).hex())
+        hz = hz * 100 + pair
+    return hz
+
+
+def build_frame(command, data=b"", address=DEFAULT_ADDRESS, controller=CONTROLLER_ADDRESS):
+    return bytes((PREAMBLE, PREAMBLE, address, controller, command)) + bytes(data) + bytes((END,))
+
+
+def set_frequency_frame(hz, address=DEFAULT_ADDRESS, controller=CONTROLLER_ADDRESS, command=SET_FREQUENCY):
+    return build_frame(command, encode_frequency(hz), address, controller)
+
+
+def read_frequency_frame(address=DEFAULT_ADDRESS, controller=CONTROLLER_ADDRESS):
+    return build_frame(READ_FREQUENCY, b"", address, controller)
+
+
+def read_s_meter_frame(address=DEFAULT_ADDRESS, controller=CONTROLLER_ADDRESS):
+    return build_frame(READ_METER, bytes((S_METER,)), address, controller)
+
+
+def decode_level(data):
+    """Meter levels come back as 4 BCD digits, most significant first (0000 to 0255)."""
+    if len(data) != 2 or _FROM_BCD[data[0]] < 0 or _FROM_BCD[data[1]] < 0:
+        raise ValueError("not a BCD level: %s" % bytes(data).hex())
+    return _FROM_BCD[data[0]] * 100 + _FROM_BCD[data[1]]
+
+
+def pack_frames(frames):
+    """Join already built frames into one buffer for a single write."""
+    return b"".join(frames)
+
+
+def pack_frequencies(frequencies, address=DEFAULT_ADDRESS, controller=CONTROLLER_ADDRESS, command=SET_FREQUENCY):
+    """Build one buffer holding a set-frequency frame for every Hz value given."""
+    head = bytes((PREAMBLE, PREAMBLE, address, controller, command))
+    tail = bytes((END,))
+    buffer = bytearray()
+    for hz in frequencies:
+        buffer += head
+        buffer += encode_frequency(hz)
+        buffer += tail
+    return bytes(buffer)
+
+
+def to_hex_list(frame):
+    """The frame as the "0x.." strings radio_variables_1 used to hand-type."""
+    return ["0x%02x" % byte for byte in frame]
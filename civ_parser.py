@@ -0,0 +1,116 @@
+#  Streaming CI-V reply parser.  Bytes are fed in as they come off the port, in
+#  whatever pieces the driver hands back, and complete FE FE .. FD frames come
+#  out.  Our own echo is dropped, and anything that is not a frame (line noise,
+#  a collision jam, a frame cut short by a new preamble) is skipped until the
+#  next FE FE.
+from collections import namedtuple
+
+from civ_frame import PREAMBLE, END, CONTROLLER_ADDRESS, OK, NG, FREQUENCY_BYTES, decode_frequency
+from civ_frame import SET_FREQUENCY_TRANSCEIVE, READ_FREQUENCY, SET_FREQUENCY, READ_METER, decode_level
+
+JAM = 0xfc  # sent on the bus after a collision
+MAX_FRAME = 64
+FREQUENCY_COMMANDS = (SET_FREQUENCY_TRANSCEIVE, READ_FREQUENCY, SET_FREQUENCY)
+
+
+class Frame(namedtuple("Frame", "to sender command data")):
+    __slots__ = ()
+
+    @property
+    def is_ok(self):
+        return self.command == OK
+
+    @property
+    def is_ng(self):
+        return self.command == NG
+
+    @property
+    def is_ack(self):
+        return self.command in (OK, NG)
+
+    @property
+    def frequency(self):
+        """Hz for frequency replies and transceive frames (commands 0x00, 0x03, 0x05)."""
+        if self.command not in FREQUENCY_COMMANDS or len(self.data) < FREQUENCY_BYTES:
+            return None
+        return decode_frequency(self.data)
+
+    @property
+    def level(self):
+        """0-255 for meter replies (command 0x15), e.g. the S-meter."""
+        if self.command != READ_METER or len(self.data) != 3:
+            return None
+        return decode_level(self.data[1:])
+
+    @property
+    def raw(self):
+        return bytes((PREAMBLE, PREAMBLE, self.to, self.sender, self.command)) + self.data + bytes((END,))
+
+
+class FrameParser(object):
+    """Turns a byte stream into Frames; feed() returns the frames completed so far."""
+
+    def __init__(self, controller=CONTROLLER_ADDRESS, drop_echo=True):
+        self.controller = controller
+        self.drop_echo = drop_echo
+        self._buffer = bytearray()
+        self.garbage = 0  # bytes thrown away while resyncing
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        start = 0
+        while True:
+            begin = buffer.find(b"\xfe\xfe", start)
+            if begin < 0:
+                #  keep a trailing FE, it may be the first half of a preamble
+                keep = len(buffer) - 1 if buffer[-1:] == b"\xfe" else len(buffer)
+                self.garbage += keep - start
+                del buffer[:keep]
+                return frames
+            self.garbage += begin - start
+            body = begin + 2
+            while body < len(buffer) and buffer[body] == PREAMBLE:  # FE FE FE .. is still one preamble
+                body += 1
+            end = buffer.find(END, body)
+            resync = self._find_break(buffer, body, len(buffer) if end < 0 else end)
+            if resync is not None:
+                self.garbage += resync - begin
+                start = resync
+                continue
+            if end < 0:
+                if len(buffer) - body > MAX_FRAME:
+                    self.garbage += len(buffer) - begin
+                    del buffer[:]
+                    return frames
+                del buffer[:begin]
+                return frames
+            start = end + 1
+            if end - body < 3:
+                self.garbage += start - begin
+                continue
+            frame = Frame(buffer[body], buffer[body + 1], buffer[body + 2], bytes(buffer[body + 3:end]))
+            if self.drop_echo and frame.sender == self.controller:
+                continue
+            frames.append(frame)
+
+    def reset(self):
+        del self._buffer[:]
+
+    @staticmethod
+    def _find_break(buffer, body, end):
+        #  a preamble or jam byte inside the frame means it was cut short;
+        #  resume scanning from there
+        for index in range(body, end):
+            byte = buffer[index]
+            if byte == PREAMBLE:
+                return index
+            if byte == JAM:
+                return index + 1
+        return None
+
+
+def parse(data, controller=CONTROLLER_ADDRESS, drop_echo=True):
+    """Every complete frame in one block of bytes."""
+    return FrameParser(controller, drop_echo).feed(data)
@@ -1 +1,148 @@
-# todo: decode from frequency_save.csv to output the frequency.
+#  Decode frequency_save.csv back into frequencies.
+#  Each row is "<datetime>,/ 0xfe/ 0xfe/ 0x94/ ..." holding whatever came off the
+#  port (echo and/or reply).  The log is read in blocks; all hex tokens of a block
+#  are parsed at once into a uint8 matrix (one row per log line) and the BCD
+#  frequency field is decoded for every row together with numpy; nothing runs
+#  per row in Python.
+import sys
+
+import numpy as np
+
+from civ_frame import PREAMBLE, END, SET_FREQUENCY_TRANSCEIVE, READ_FREQUENCY, SET_FREQUENCY, FREQUENCY_BYTES
+
+CHUNK_BYTES = 1 << 22
+NO_FREQUENCY = -1
+FREQUENCY_FRAME = 6 + FREQUENCY_BYTES  # FE FE to from command <5 bytes> FD
+
+_HEX = np.full(256, -1, dtype=np.int16)
+for _digit in b"0123456789abcdef":
+    _HEX[_digit] = int(chr(_digit), 16)
+    _HEX[ord(chr(_digit).upper())] = int(chr(_digit), 16)
+_FROM_BCD = np.full(256, -1, dtype=np.int64)
+for _n in range(100):
+    _FROM_BCD[(_n // 10) << 4 | _n % 10] = _n
+del _digit, _n
+_PAIR_WEIGHTS = 100 ** np.arange(FREQUENCY_BYTES, dtype=np.int64)
+#  str(datetime): "YYYY-MM-DD HH:MM:SS" plus ".ffffff" unless the microseconds are 0
+_STAMP = np.frombuffer(b"0000-00-00 00:00:00.000000", dtype=np.uint8)
+_STAMP_DIGITS = _STAMP == ord("0")
+_STAMP_LENGTHS = (19, len(_STAMP))
+_MONTH_DAYS = np.array([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+_FREQUENCY_COMMANDS = (SET_FREQUENCY_TRANSCEIVE, READ_FREQUENCY, SET_FREQUENCY)
+
+
+def parse_block(block):
+    """Split a block of whole log lines into (timestamps, byte matrix, row lengths)."""
+    if not block.endswith(b"\n"):
+        block += b"\n"
+    padded = np.frombuffer(block + b"\n\n", dtype=np.uint8)  # room to look two bytes past a token
+    chars = padded[:len(block)]
+    newlines = np.flatnonzero(chars == ord("\n"))
+    starts = np.concatenate(([0], newlines[:-1] + 1))
+    line_count = len(newlines)
+
+    #  hex tokens: every "x" starts one, followed by one or two hex digits
+    xs = np.flatnonzero(chars == ord("x"))
+    first, second = _HEX[padded[xs + 1]], _HEX[padded[xs + 2]]
+    values = np.where(second >= 0, first * 16 + second, first).astype(np.uint8)
+    rows = np.searchsorted(newlines, xs)
+    lengths = np.bincount(rows, minlength=line_count)
+    columns = np.arange(len(xs)) - (np.cumsum(lengths) - lengths)[rows]
+    matrix = np.zeros((line_count, max(int(lengths.max(initial=0)), FREQUENCY_FRAME)), dtype=np.uint8)
+    matrix[rows, columns] = values
+
+    #  timestamps: everything before the first comma, blank lines are skipped
+    commas = np.append(np.flatnonzero(chars == ord(",")), len(chars))
+    comma = commas[np.searchsorted(commas, starts)]
+    keep = (comma > starts) & (comma < newlines)
+    width = int((comma - starts)[keep].max(initial=1))
+    offsets = starts[keep, None] + np.arange(width)
+    stamps = np.where(offsets < comma[keep, None], chars[np.minimum(offsets, len(chars) - 1)], 0).astype(np.uint8)
+    #  a line cut short by a crash (or any other junk) is dropped like a line
+    #  without a comma, instead of failing the whole block
+    good = _valid_stamps(stamps, (comma - starts)[keep])
+    stamps = np.ascontiguousarray(stamps[good])
+    timestamps = stamps.view("S%d" % width).ravel().astype("datetime64[us]")
+    keep[keep] = good
+    return timestamps, matrix[keep], lengths[keep]
+
+
+def _valid_stamps(stamps, widths):
+    """Rows of stamps that hold a str(datetime) numpy can convert."""
+    head = np.zeros((len(stamps), len(_STAMP)), dtype=np.uint8)
+    head[:, :min(stamps.shape[1], len(_STAMP))] = stamps[:, :len(_STAMP)]
+    digits = head - np.uint8(ord("0"))  # wraps around for anything below "0"
+    head[:, 10][head[:, 10] == ord("T")] = ord(" ")
+    shaped = (digits <= 9) == _STAMP_DIGITS
+    shaped[:, ~_STAMP_DIGITS] = head[:, ~_STAMP_DIGITS] == _STAMP[~_STAMP_DIGITS]
+    valid = np.where(widths == _STAMP_LENGTHS[1], shaped.all(axis=1),
+                     (widths == _STAMP_LENGTHS[0]) & shaped[:, :_STAMP_LENGTHS[0]].all(axis=1))
+    pairs = digits[:, 5:19].astype(np.int16)
+    month, day, hour, minute, second = (pairs[:, i] * 10 + pairs[:, i + 1] for i in (0, 3, 6, 9, 12))
+    year = digits[:, 3].astype(np.int16) + digits[:, 2] * 10
+    year += digits[:, 1].astype(np.int16) * 100 + digits[:, 0].astype(np.int16) * 1000
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = _MONTH_DAYS[np.minimum(month, 12)] - ((month == 2) & ~leap)
+    return (valid & (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_days)
+            & (hour < 24) & (minute < 60) & (second < 60))
+
+
+def decode_frames(matrix):
+    """Hz held in the last frequency frame of every row, NO_FREQUENCY where there is none."""
+    width = matrix.shape[1]
+    hz = np.full(len(matrix), NO_FREQUENCY, dtype=np.int64)
+    if width < FREQUENCY_FRAME or not len(matrix):
+        return hz
+    #  a frequency frame ends at column p when p is FD, p-10 and p-9 are the
+    #  preamble and p-6 is one of the frequency commands
+    ends = np.arange(FREQUENCY_FRAME - 1, width)
+    found = ((matrix[:, ends] == END)
+             & (matrix[:, ends - 10] == PREAMBLE)
+             & (matrix[:, ends - 9] == PREAMBLE)
+             & np.isin(matrix[:, ends - 6], _FREQUENCY_COMMANDS))
+    has_frame = found.any(axis=1)
+    last = ends[found.shape[1] - 1 - np.argmax(found[:, ::-1], axis=1)]
+    fields = matrix[np.arange(len(matrix))[:, None], last[:, None] - FREQUENCY_BYTES + np.arange(FREQUENCY_BYTES)]
+    pairs = _FROM_BCD[fields]
+    valid = has_frame & (pairs >= 0).all(axis=1)
+    hz[valid] = pairs[valid] @ _PAIR_WEIGHTS
+    return hz
+
+
+def iter_blocks(path="frequency_save.csv", chunk_bytes=CHUNK_BYTES):
+    """Yield parse_block() results for the log, one block of whole lines at a time."""
+    with open(path, "rb") as log:
+        rest = b""
+        while True:
+            data = log.read(chunk_bytes)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b"\n") + 1
+            if not cut:
+                rest = data
+                continue
+            block, rest = data[:cut], data[cut:]
+            yield parse_block(block)
+        if rest.strip():
+            yield parse_block(rest)
+
+
+def iter_log(path="frequency_save.csv", chunk_bytes=CHUNK_BYTES):
+    """Yield (timestamps, hz) arrays one block at a time so memory stays bounded."""
+    for timestamps, matrix, _ in iter_blocks(path, chunk_bytes):
+        yield timestamps, decode_frames(matrix)
+
+
+def read_log(path="frequency_save.csv", chunk_bytes=CHUNK_BYTES):
+    """The whole log as (timestamps, hz) arrays."""
+    parts = list(iter_log(path, chunk_bytes))
+    if not parts:
+        return np.array([], dtype="datetime64[us]"), np.array([], dtype=np.int64)
+    return np.concatenate([part[0] for part in parts]), np.concatenate([part[1] for part in parts])
+
+
+if __name__ == "__main__":
+    for timestamps, hz in iter_log(sys.argv[1] if len(sys.argv) > 1 else "frequency_save.csv"):
+        for stamp, frequency in zip(timestamps, hz):
+            print(stamp, frequency if frequency != NO_FREQUENCY else "")
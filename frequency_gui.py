@@ -1,22 +1,222 @@
+#  Web front end for the radio.  The app owns one RadioSession and one poller;
+#  browsers get JSON endpoints to read and set the frequency and a Server-Sent
+#  Events stream fed from that single poller, so open dashboards cost no extra
+#  radio traffic.  Each open stream does hold one CherryPy worker thread, so
+#  main() sizes the pool to THREAD_POOL and streams beyond MAX_STREAMS get a 503,
+#  leaving threads free for the JSON endpoints and the page itself.
+import html
+import json
+import queue
+import threading
+
 import cherrypy
-from radio_variables_1 import hihihi
-import radio_variables_1
+
+from gui_templates import load_templates
+
+STREAM_BACKLOG = 16  # readings kept per slow browser before the oldest is dropped
+KEEPALIVE = 15
+MAX_STREAMS = 20
+THREAD_POOL = MAX_STREAMS + 10
+#  engine "stop" priority for closing the streams: ahead of the HTTP server (25),
+#  which waits for every worker thread, stream threads included
+CLOSE_STREAMS_PRIORITY = 10
+#  port, baudrate and the addresses only take effect when the session is opened,
+#  so the page may change these two and nothing else
+LIVE_SETTINGS = ("mode", "target_frequency")
+
+
+_CLOSED = object()  # ends a stream
+
+
+class Broadcaster(object):
+    """Fans poller readings out to one queue per connected stream."""
+
+    def __init__(self, limit=MAX_STREAMS):
+        self.limit = limit
+        self._clients = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, reading):
+        #  the poller thread and the session thread (transceive broadcasts) both
+        #  publish; the lock keeps drop-oldest-then-put in one piece so the
+        #  other one cannot fill the queue in between
+        with self._lock:
+            for client in self._clients:
+                self._put(client, reading)
+
+    @staticmethod
+    def _put(client, item):
+        #  called with the lock held
+        try:
+            client.put_nowait(item)
+        except queue.Full:
+            try:
+                client.get_nowait()
+            except queue.Empty:  # the stream took one meanwhile
+                pass
+            client.put_nowait(item)  # only lock holders put, so there is room
+
+    def close(self):
+        """End every open stream, e.g. when the engine stops; new streams can still subscribe."""
+        with self._lock:
+            clients, self._clients = self._clients, set()
+            for client in clients:
+                self._put(client, _CLOSED)
+
+    def subscribe(self):
+        """A queue for one more stream, or None once limit streams are open."""
+        client = queue.Queue(STREAM_BACKLOG)
+        with self._lock:
+            if len(self._clients) >= self.limit:
+                return None
+            self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+
+def _reading_json(reading):
+    if reading is None:
+        return {"timestamp": None, "hz": None}
+    return {"timestamp": reading.timestamp, "hz": reading.hz}
+
+
 class index(object):
+    def __init__(self, radio, poller, templates=None, state=None):
+        self.radio = radio
+        self.poller = poller
+        self.templates = templates or load_templates()
+        self.broadcaster = Broadcaster()
+        poller.listeners.append(self.broadcaster)
+        cherrypy.engine.subscribe("stop", self.broadcaster.close, priority=CLOSE_STREAMS_PRIORITY)
+        self.state = state  # radio_config.RadioState shared with the rest of the process, if any
+        self._target = None
+        if state is not None:
+            state.subscribe(self._on_state)
+
+    def _on_state(self, state, changed):
+        #  a new target set by someone else in this process goes to the radio too
+        hz = changed.get("target_frequency")
+        if hz is not None and hz != self._target:
+            self._target = hz
+            self.radio.set_frequency(hz).add_done_callback(lambda future: self._on_target_set(hz, future))
+
+    def _on_target_set(self, hz, future):
+        #  runs on the session thread.  If the radio refused the new target, put
+        #  the target back to where the radio actually is so the stored state
+        #  does not claim a frequency the rig never took.
+        try:
+            error = None if future.result().is_ok else "NG from the radio"
+        except Exception as exception:
+            error = exception
+        if error is None:
+            return
+        cherrypy.log("target frequency %d not set: %s" % (hz, error))
+        latest = self.poller.latest
+        if latest is None or self.state.target_frequency != hz:
+            return  # nothing to go back to, or already superseded
+        self._target = latest.hz  # so the revert is not sent to the radio again
+        self.state.update(target_frequency=latest.hz)
+
     @cherrypy.expose
     def index(self):
-        return """
-    <html>
-          <head></head>
-          <body>
-            <form method="get" action="generate">
-              <input type="text" value="8" name="length" />
-              <button type="submit">Give it now!</button>
-            <input type="button" id='send_request' name="send_request_button" value=" run send_request.py " onclick="exec('python send_request.py');">
-            <p> %(hihihi)s </p>
-            </form>
-          </body>
-        </html>""" % {"hihihi": hihihi}
-    #  radio = 0
-    radio_variables_1.radio = 0  # change the value in fileB's namespace
-cherrypy.server.socket_host = '0.0.0.0'
-cherrypy.quickstart(index())
\ No newline at end of file
+        latest = self.poller.latest
+        return self.templates["index"].substitute(
+            port=html.escape(str(self.radio.session.port)),
+            address="%02x" % self.radio.address,
+            frequency="" if latest is None else "%.3f" % (latest.hz / 1000))
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def frequency(self, hz=None):
+        """GET: last reading from the poller.  POST hz=<int>: set the frequency."""
+        if cherrypy.request.method != "POST":
+            return _reading_json(self.poller.latest)
+        try:
+            hz = int(hz)
+            future = self.radio.set_frequency(hz)
+        except (TypeError, ValueError) as error:
+            raise cherrypy.HTTPError(400, str(error))
+        try:
+            reply = future.result()
+        except Exception as error:
+            raise cherrypy.HTTPError(504, str(error))
+        if reply.is_ok and self.state is not None:
+            self._target = hz
+            self.state.update(target_frequency=hz)
+        return {"ok": reply.is_ok, "hz": hz}
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def settings(self, **changes):
+        """GET: the shared settings.  POST: change mode and/or target_frequency."""
+        if self.state is None:
+            raise cherrypy.NotFound()
+        if cherrypy.request.method == "POST":
+            fixed = sorted(set(changes) - set(LIVE_SETTINGS))
+            if fixed:
+                raise cherrypy.HTTPError(400, "cannot change %s while running; edit %s and restart"
+                                         % (", ".join(fixed), self.state.path))
+            try:
+                self.state.update(**changes)
+            except (KeyError, ValueError) as error:
+                raise cherrypy.HTTPError(400, str(error))
+        return self.state.as_dict()
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    def history(self):
+        return [_reading_json(reading) for reading in self.poller.readings()]
+
+    @cherrypy.expose
+    def stream(self):
+        client = self.broadcaster.subscribe()
+        if client is None:
+            raise cherrypy.HTTPError(503, "too many open streams")
+        cherrypy.response.headers["Content-Type"] = "text/event-stream"
+        cherrypy.response.headers["Cache-Control"] = "no-cache"
+        latest = self.poller.latest
+
+        def events():
+            try:
+                if latest is not None:
+                    yield ("data: %s\n\n" % json.dumps(_reading_json(latest))).encode()
+                while True:
+                    try:
+                        reading = client.get(timeout=KEEPALIVE)
+                    except queue.Empty:
+                        yield b": keepalive\n\n"
+                        continue
+                    if reading is _CLOSED:
+                        return
+                    yield ("data: %s\n\n" % json.dumps(_reading_json(reading))).encode()
+            finally:
+                self.broadcaster.unsubscribe(client)
+        return events()
+    stream._cp_config = {"response.stream": True}
+
+
+def main(state=None):
+    from frequency_log import FrequencyLogWriter
+    from poller import FrequencyPoller
+    from radio_config import get_state
+    from radio_session import RadioSession
+    state = state or get_state()
+    session = RadioSession(state.port, state.baudrate).open()
+    log = FrequencyLogWriter()
+    poller = FrequencyPoller(session.radio(state.address), log).start()
+
+    def shutdown():
+        poller.stop()
+        session.close()
+        log.close()
+    cherrypy.engine.subscribe('stop', shutdown)
+    cherrypy.server.socket_host = '0.0.0.0'
+    cherrypy.server.thread_pool = THREAD_POOL  # one thread per open stream, see MAX_STREAMS
+    cherrypy.quickstart(index(poller.radio, poller, state=state))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+#  Compact binary frequency log.
+#  The file is an 8-byte header followed by fixed-width 40-byte records:
+#      timestamp  float64  seconds since the epoch
+#      hz         int64    decoded frequency, -1 when the frame held none
+#      length     uint8    bytes used in frame
+#      frame      23 bytes raw CI-V bytes as they came off the port
+#  Records are appended in time order, so the reader can mmap the file and
+#  binary-search it by timestamp instead of scanning it.
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+LOG_PATH = "frequency_save.civlog"
+MAGIC = b"CIVLOG1\n"
+RECORD = struct.Struct("<dqB23s")
+FRAME_BYTES = 23
+NO_FREQUENCY = -1
+BUFFER_RECORDS = 256
+FLUSH_INTERVAL = 1.0
+
+Record = namedtuple("Record", "timestamp hz frame")
+
+
+def _seconds(when):
+    return when.timestamp() if isinstance(when, datetime) else float(when)
+
+
+class FrequencyLogWriter(object):
+    """Appends records through an in-memory buffer; the file stays open until close()."""
+
+    def __init__(self, path=LOG_PATH, buffer_records=BUFFER_RECORDS, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.buffer_records = buffer_records
+        self.flush_interval = flush_interval
+        self._file = open(path, "a+b")  # writes always go to the end, reads check the header
+        size = self._file.seek(0, os.SEEK_END)
+        if size == 0:
+            self._file.write(MAGIC)
+        else:
+            self._file.seek(0)
+            if self._file.read(len(MAGIC)) != MAGIC:
+                self._file.close()
+                raise ValueError("%s is not a frequency log" % path)
+            #  drop a partial record left by a crash so the records stay aligned
+            whole = len(MAGIC) + (size - len(MAGIC)) // RECORD.size * RECORD.size
+            if whole != size:
+                self._file.truncate(whole)
+        self._buffer = bytearray()
+        self._count = 0
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def append(self, hz, frame=b"", timestamp=None):
+        frame = bytes(frame)[:FRAME_BYTES]
+        record = RECORD.pack(time.time() if timestamp is None else _seconds(timestamp),
+                             NO_FREQUENCY if hz is None else int(hz), len(frame), frame)
+        with self._lock:
+            self._buffer += record
+            self._count += 1
+            if self._count >= self.buffer_records:
+                self.flush()
+            elif self._timer is None:
+                #  a quiet log still reaches the disk within flush_interval
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def append_packed(self, data):
+        """Append records that are already packed, e.g. a numpy array's bytes."""
+        if len(data) % RECORD.size:
+            raise ValueError("data is not a whole number of records")
+        with self._lock:
+            self.flush()
+            self._file.write(data)
+            self._file.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._buffer and not self._file.closed:
+                self._file.write(self._buffer)
+                self._file.flush()
+                del self._buffer[:]
+            self._count = 0
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self.flush()
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrequencyLogReader(object):
+    """Read-only mmap view of a log; refresh() picks up records appended since."""
+
+    def __init__(self, path=LOG_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = None
+        self._count = 0
+        self.refresh()
+
+    def refresh(self):
+        size = os.fstat(self._file.fileno()).st_size
+        if size and self._file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a frequency log" % self.path)
+        self._file.seek(0)
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._count = max(size - len(MAGIC), 0) // RECORD.size
+        if self._count:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        timestamp, hz, length, frame = RECORD.unpack_from(self._map, len(MAGIC) + index * RECORD.size)
+        return Record(timestamp, hz, frame[:length])
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def _timestamp(self, index):
+        return struct.unpack_from("<d", self._map, len(MAGIC) + index * RECORD.size)[0]
+
+    def bisect(self, when):
+        """Index of the first record at or after when."""
+        when = _seconds(when)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp(middle) < when:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def between(self, start=None, stop=None):
+        """Records with start <= timestamp < stop; either end may be left open."""
+        first = 0 if start is None else self.bisect(start)
+        last = self._count if stop is None else self.bisect(stop)
+        for index in range(first, last):
+            yield self[index]
+
+    def latest(self):
+        return self[-1] if self._count else None
+
+    def arrays(self, start=None, stop=None):
+        """(timestamps, hz) as numpy arrays, copied so refresh() and close() stay free to unmap."""
+        import numpy as np
+        dtype = _record_dtype()
+        first = 0 if start is None else self.bisect(start)
+        last = self._count if stop is None else self.bisect(stop)
+        if last <= first:
+            return np.array([], dtype="<f8"), np.array([], dtype="<i8")
+        records = np.frombuffer(self._map, dtype=dtype, count=last - first, offset=len(MAGIC) + first * RECORD.size)
+        return records["timestamp"].copy(), records["hz"].copy()
+
+
+def _record_dtype():
+    import numpy as np
+    return np.dtype([("timestamp", "<f8"), ("hz", "<i8"), ("length", "u1"), ("frame", "S%d" % FRAME_BYTES)])
+
+
+def convert_csv(csv_path="frequency_save.csv", log_path="frequency_save_csv.civlog"):
+    """Import an old frequency_save.csv into a new binary log; returns the number of records."""
+    import numpy as np
+    import decode_frequency  # needs numpy, which only the importer uses
+    #  bisect relies on time order, so old rows must not land after newer records
+    if os.path.exists(log_path) and os.path.getsize(log_path) > len(MAGIC):
+        raise ValueError("%s already holds records; convert into a new file" % log_path)
+    dtype = _record_dtype()
+    count = 0
+    with FrequencyLogWriter(log_path) as log:
+        for timestamps, matrix, lengths in decode_frequency.iter_blocks(csv_path):
+            records = np.zeros(len(timestamps), dtype=dtype)
+            #  the csv holds naive local times, as written by datetime.fromtimestamp;
+            #  UTC offsets only change on the hour, so work them out once per hour
+            naive = timestamps.astype(np.int64) / 1e6
+            hours, inverse = np.unique(naive // 3600, return_inverse=True)
+            offsets = np.array([(datetime(1970, 1, 1) + timedelta(hours=hour)).timestamp() - hour * 3600
+                                for hour in hours])
+            records["timestamp"] = naive + offsets[inverse]
+            records["hz"] = decode_frequency.decode_frames(matrix)
+            width = min(matrix.shape[1], FRAME_BYTES)
+            records["length"] = np.minimum(lengths, width)
+            frames = np.zeros((len(matrix), FRAME_BYTES), dtype=np.uint8)
+            frames[:, :width] = matrix[:, :width]
+            records["frame"] = frames.view("S%d" % FRAME_BYTES).ravel()
+            log.append_packed(records.tobytes())
+            count += len(records)
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "convert":
+        arguments = sys.argv[2:] or ["frequency_save.csv"]
+        target = arguments[1] if len(arguments) > 1 else os.path.splitext(arguments[0])[0] + "_csv.civlog"
+        print("%d records written to %s" % (convert_csv(arguments[0], target), target))
+    else:
+        with FrequencyLogReader(sys.argv[1] if len(sys.argv) > 1 else LOG_PATH) as reader:
+            for record in reader:
+                print(datetime.fromtimestamp(record.timestamp), record.hz, record.frame.hex())
@@ -1,10 +1,12 @@
 import cherrypy
+from gui_templates import load_templates
 class HelloWorld(object):
+    def __init__(self):
+        self.templates = load_templates()  # read and compiled once, not per request
+
     @cherrypy.expose
     def index(self):
-        loader = 'x'
-        tmpl = loader.load('gui_exe.html')
-
-        return tmpl.generate(title='Sample').render('html', doctype='html')
-cherrypy.server.socket_host = '0.0.0.0'
-cherrypy.quickstart(HelloWorld())
\ No newline at end of file
+        return self.templates['gui_exe'].substitute(title='Sample')
+if __name__ == '__main__':
+    cherrypy.server.socket_host = '0.0.0.0'
+    cherrypy.quickstart(HelloWorld())
@@ -0,0 +1,17 @@
+#  Page templates for the CherryPy apps.  Every templates/*.html file is read and
+#  compiled into a string.Template once, when the app is built, so serving a page
+#  is only a substitute() call.  Templates use $name placeholders.
+import os
+from string import Template
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+
+def load_templates(directory=TEMPLATE_DIR):
+    """Map of file name (without .html) to compiled Template."""
+    templates = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".html"):
+            with open(os.path.join(directory, name), encoding="utf-8") as template_file:
+                templates[name[:-len(".html")]] = Template(template_file.read())
+    return templates
@@ -0,0 +1,116 @@
+#  Background frequency poller.
+#  Reads the frequency on a schedule that adapts to activity: every reading that
+#  matches the previous one stretches the interval (up to max_interval), a change
+#  snaps it back to min_interval.  Polling waits while a write is queued so set
+#  commands never queue up behind reads, and transceive broadcasts from the radio
+#  (someone turning the dial) count as readings too.  Every reading goes into a
+#  fixed-size ring buffer; only changes go on to the on-disk log.
+import threading
+import time
+from collections import deque, namedtuple
+
+import civ_frame
+
+MIN_INTERVAL = .2
+MAX_INTERVAL = 5.0
+BACKOFF = 1.5
+HISTORY = 1024
+
+Reading = namedtuple("Reading", "timestamp hz")
+
+
+class FrequencyPoller(object):
+    """Polls one Radio from a daemon thread; start() / stop()."""
+
+    def __init__(self, radio, log=None, history=HISTORY,
+                 min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, backoff=BACKOFF):
+        self.radio = radio
+        self.log = log  # a FrequencyLogWriter, or None to keep readings in memory only
+        self.history = deque(maxlen=history)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self.latest = None
+        self.listeners = []  # called with each Reading whose frequency differs from the last
+        self.polls = 0
+        self.errors = 0
+        self._logged = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self.radio.session.listeners.append(self._on_frame)
+            self.radio.session.idle_listeners.append(self.wake)
+            self._thread = threading.Thread(target=self._run, name="poller-%02x" % self.radio.address, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        thread.join()
+        self.radio.session.listeners.remove(self._on_frame)
+        self.radio.session.idle_listeners.remove(self.wake)
+        if self.log is not None:
+            self.log.flush()
+
+    def wake(self):
+        """Poll again right away; called by the session when its writes are done."""
+        self.interval = self.min_interval
+        self._wake.set()
+
+    def readings(self):
+        """Recent readings, oldest first."""
+        with self._lock:
+            return list(self.history)
+
+    def _run(self):
+        session = self.radio.session
+        while not self._stop.is_set():
+            if session.writes_pending:
+                session.wait_for_writes()
+                self.interval = self.min_interval  # a write most likely moved the frequency
+            try:
+                reply = self.radio.read_frequency().result()
+            except Exception:  # timeouts, but also a port that went away; keep polling
+                self.errors += 1
+                self.interval = self.max_interval
+            else:
+                self.polls += 1
+                if reply.frequency is not None:
+                    if self._record(reply):
+                        self.interval = self.min_interval
+                    else:
+                        self.interval = min(self.interval * self.backoff, self.max_interval)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _on_frame(self, frame):
+        #  runs on the session thread: transceive broadcast from our radio
+        if frame.sender == self.radio.address and frame.command == civ_frame.SET_FREQUENCY_TRANSCEIVE:
+            if frame.frequency is not None and self._record(frame):
+                self.interval = self.min_interval
+                self._wake.set()
+
+    def _record(self, frame):
+        hz = frame.frequency
+        reading = Reading(time.time(), hz)
+        with self._lock:
+            changed = self.latest is None or self.latest.hz != hz
+            self.history.append(reading)
+            self.latest = reading
+            if self.log is not None and hz != self._logged:
+                self.log.append(hz, frame.raw, reading.timestamp)
+                self._logged = hz
+        if changed:
+            for listener in self.listeners:
+                listener(reading)
+        return changed
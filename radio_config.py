@@ -0,0 +1,120 @@
+#  Shared radio settings: mode, target frequency, serial port and CI-V addresses.
+#  One RadioState per process, created on first use by get_state(); nothing is
+#  read or written at import.  The state is loaded from radio_state.json the
+#  first time it is asked for and written back only when a value actually
+#  changes, through a temporary file and os.replace() so a crash never leaves a
+#  half-written file.  subscribe() lets the GUI, poller and sender react to
+#  changes instead of re-reading files or poking each other's globals.
+import json
+import os
+import tempfile
+import threading
+
+import civ_frame
+
+STATE_PATH = "radio_state.json"
+SEND = "send"  # radio = 1 in the old radio_variables_1
+READ = "read"  # radio = 0
+MODES = (SEND, READ)
+
+DEFAULTS = {
+    "mode": SEND,
+    "target_frequency": 3955000,
+    "port": "COM4",
+    "baudrate": 19200,
+    "address": civ_frame.DEFAULT_ADDRESS,
+    "controller": civ_frame.CONTROLLER_ADDRESS,
+}
+
+
+class RadioState(object):
+    """Settings with attribute access; update() persists and notifies on change."""
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._values = None
+        self._listeners = []
+        self._lock = threading.RLock()
+
+    def _load(self):
+        #  called with the lock held
+        if self._values is None:
+            values = dict(DEFAULTS)
+            try:
+                with open(self.path, encoding="utf-8") as state_file:
+                    stored = json.load(state_file)
+            except FileNotFoundError:
+                stored = {}
+            values.update((key, value) for key, value in stored.items() if key in DEFAULTS)
+            self._values = values
+        return self._values
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name not in DEFAULTS:
+            raise AttributeError(name)
+        with self._lock:
+            return self._load()[name]
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self._load())
+
+    def update(self, **changes):
+        """Set values; returns the ones that actually changed."""
+        unknown = set(changes) - set(DEFAULTS)
+        if unknown:
+            raise KeyError("unknown setting(s): %s" % ", ".join(sorted(unknown)))
+        if "mode" in changes and changes["mode"] not in MODES:
+            raise ValueError("mode has to be one of %r" % (MODES,))
+        for key, value in changes.items():
+            if isinstance(DEFAULTS[key], int) and not isinstance(value, int):
+                changes[key] = int(value, 0) if isinstance(value, str) else int(value)  # "0x94" from a form
+        if "target_frequency" in changes:
+            civ_frame.encode_frequency(changes["target_frequency"])  # range check
+        with self._lock:
+            values = self._load()
+            changed = {key: value for key, value in changes.items() if values[key] != value}
+            if not changed:
+                return changed
+            values.update(changed)
+            self._save(values)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(self, changed)
+        return changed
+
+    def subscribe(self, listener):
+        """listener(state, changed) runs after every update that changed something."""
+        with self._lock:
+            self._listeners.append(listener)
+        return listener
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            self._listeners.remove(listener)
+
+    def _save(self, values):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, temporary = tempfile.mkstemp(prefix=".radio_state.", dir=directory)
+        try:
+            with os.fdopen(handle, "w", encoding="utf-8") as state_file:
+                json.dump(values, state_file, indent=2, sort_keys=True)
+                state_file.flush()
+                os.fsync(state_file.fileno())
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_state(path=None):
+    """The process-wide RadioState, created the first time it is asked for."""
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = RadioState(path or STATE_PATH)
+        return _state
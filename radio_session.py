@@ -0,0 +1,319 @@
+#  Long-lived CI-V sessions.  One RadioSession owns one serial port and keeps it
+#  open; every command goes through a single queue so callers from any thread
+#  can share the port, and each caller gets a Future holding the radio's reply.
+#  Several radios can sit on one port (CI-V is a bus), and RadioManager keeps one
+#  session per port so a whole rack of rigs can be driven from one process.
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import civ_frame
+from civ_frame import CONTROLLER_ADDRESS, DEFAULT_ADDRESS
+from civ_parser import FrameParser
+
+DEFAULT_BAUDRATE = 19200
+REPLY_TIMEOUT = .5
+IDLE_READ = .05  # how often an idle session looks for unsolicited frames
+
+_STOP = object()
+
+log = logging.getLogger(__name__)
+
+
+class RadioTimeout(Exception):
+    pass
+
+
+class SessionClosed(RuntimeError):
+    pass
+
+
+class _Command(object):
+    def __init__(self, frame, timeout):
+        self.frame = bytes(frame)
+        self.timeout = timeout
+        self.future = Future()
+        self.is_write = len(self.frame) > 4 and self.frame[4] not in civ_frame.READ_COMMANDS
+
+
+class RadioSession(object):
+    """Keeps one serial port open and runs queued CI-V commands one at a time."""
+
+    def __init__(self, port, baudrate=DEFAULT_BAUDRATE, timeout=REPLY_TIMEOUT, serial_port=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self._serial = serial_port
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._writes = 0
+        self._writes_done = threading.Condition()
+        self._parser = FrameParser(drop_echo=False)
+        self._frames = deque()
+        self.listeners = []  # called with frames that are not a reply, e.g. transceive broadcasts
+        self.idle_listeners = []  # called once the last queued write has completed
+
+    def open(self):
+        with self._lock:
+            self._closed = False
+            self._open()
+        return self
+
+    def _open(self):
+        #  called with the lock held
+        if self._thread is not None:
+            return
+        if self._serial is None:
+            import serial  # pyserial, only needed once a real port is opened
+            self._serial = serial.Serial(None, self.baudrate, timeout=.02)
+            self._serial.port = self.port
+            #  must have one or both of these to prevent random transmit; set
+            #  before opening so the lines never go high
+            self._serial.dtr = False
+            self._serial.rts = False
+        if not getattr(self._serial, "is_open", True):
+            self._serial.open()
+        self._thread = threading.Thread(target=self._run, name="civ-%s" % self.port, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the worker and close the port; later submits raise SessionClosed."""
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(_STOP)  # under the lock, so no command is queued behind it
+        if thread is None:
+            return
+        thread.join()
+        self._serial.close()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, frame, timeout=None):
+        """Queue a complete CI-V frame; the returned Future resolves to the reply Frame."""
+        command = _Command(frame, self.timeout if timeout is None else timeout)
+        self._put([command])
+        return command.future
+
+    def submit_batch(self, frames, timeout=None):
+        """Queue several frames that go out in one write; one Future per frame, in order."""
+        timeout = self.timeout if timeout is None else timeout
+        batch = [_Command(frame, timeout) for frame in frames]
+        if batch:
+            self._put(batch)
+        return [command.future for command in batch]
+
+    def _put(self, batch):
+        #  a session that was never opened opens on first use; a closed one stays closed
+        with self._lock:
+            if self._closed:
+                raise SessionClosed("session on %s is closed" % self.port)
+            self._open()
+            self._count_writes(batch)
+            self._queue.put(batch)
+
+    def send(self, frame, timeout=None):
+        return self.submit(frame, timeout).result()
+
+    @property
+    def writes_pending(self):
+        """Commands that change the radio's state and have not completed yet."""
+        return self._writes
+
+    def wait_for_writes(self, timeout=None):
+        """Block until no write is queued or running; False if timeout ran out first."""
+        with self._writes_done:
+            return self._writes_done.wait_for(lambda: not self._writes, timeout)
+
+    def _count_writes(self, commands, step=1):
+        writes = sum(command.is_write for command in commands)
+        if not writes:
+            return
+        with self._writes_done:
+            self._writes += step * writes
+            idle = not self._writes
+            if idle:
+                self._writes_done.notify_all()
+        if idle and step < 0:
+            self._notify(self.idle_listeners)
+
+    def radio(self, address=DEFAULT_ADDRESS, controller=CONTROLLER_ADDRESS):
+        return Radio(self, address, controller)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=IDLE_READ)
+            except queue.Empty:
+                item = None
+            if item is None:
+                self._read_idle()
+                continue
+            if item is _STOP:
+                self._fail_queued()
+                break
+            running = [command.future.set_running_or_notify_cancel() for command in item]
+            self._count_writes([command for command, ok in zip(item, running) if not ok], -1)
+            batch = [command for command, ok in zip(item, running) if ok]
+            if not batch:
+                continue
+            try:
+                self._serial.write(civ_frame.pack_frames(command.frame for command in batch))
+            except Exception as error:
+                for command in batch:
+                    command.future.set_exception(error)
+                self._count_writes(batch, -1)
+                continue
+            for command in batch:
+                try:
+                    reply = self._read_reply(command)
+                except Exception as error:
+                    command.future.set_exception(error)
+                else:
+                    command.future.set_result(reply)
+                self._count_writes([command], -1)
+
+    def _fail_queued(self):
+        #  nothing should be queued behind _STOP, but never leave a Future hanging
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is _STOP:
+                continue
+            for command in item:
+                if command.future.set_running_or_notify_cancel():
+                    command.future.set_exception(SessionClosed("session on %s is closed" % self.port))
+            self._count_writes(item, -1)
+
+    def _read_reply(self, command):
+        #  the radio may broadcast transceive frames in between, and a reply that
+        #  missed its own deadline may still turn up, so only the frame that
+        #  answers this command completes it: OK/NG for a set, the same command
+        #  (and sub command) for a read, our own echo for commands the radio
+        #  never answers.  Everything else goes to the listeners.
+        try:
+            return self._wait_for_reply(command)
+        except RadioTimeout:
+            #  start the next command from a clean slate
+            self._parser.reset()
+            self._frames.clear()
+            waiting = self._serial.in_waiting
+            if waiting:
+                self._serial.read(waiting)
+            raise
+
+    def _wait_for_reply(self, command):
+        address, controller = command.frame[2], command.frame[3]
+        deadline = time.monotonic() + command.timeout
+        while True:
+            while self._frames:
+                frame = self._frames.popleft()
+                if self._answers(command, frame):
+                    return frame
+                if frame.sender != controller:
+                    self._dispatch(frame)
+            if time.monotonic() >= deadline:
+                raise RadioTimeout("no reply from 0x%02x on %s" % (address, self.port))
+            self._frames.extend(self._parser.feed(self._serial.read(self._serial.in_waiting or 1)))
+
+    @staticmethod
+    def _answers(command, frame):
+        sent = command.frame
+        if frame.sender == sent[3]:
+            #  our own echo; only the end of a command the radio does not answer
+            return sent[4] in civ_frame.NO_REPLY_COMMANDS and frame.raw == sent
+        if frame.to != sent[3] or frame.sender != sent[2]:
+            return False
+        if sent[4] in civ_frame.READ_COMMANDS:
+            #  sub command bytes (e.g. 0x02 for the S-meter) have to match too
+            return frame.command == sent[4] and frame.data[:len(sent) - 6] == sent[5:-1]
+        return frame.is_ack
+
+    def _read_idle(self):
+        #  nothing queued: still pick up what the radio sends on its own, such as
+        #  transceive broadcasts when someone turns the dial
+        if not self.listeners:
+            return
+        try:
+            waiting = self._serial.in_waiting
+            data = self._serial.read(waiting) if waiting else b""
+        except Exception:
+            return  # a port error surfaces on the next command
+        for frame in self._parser.feed(data):
+            if frame.sender != CONTROLLER_ADDRESS:
+                self._dispatch(frame)
+
+    def _dispatch(self, frame):
+        self._notify(self.listeners, frame)
+
+    def _notify(self, listeners, *args):
+        #  runs on the worker thread: a failing listener (say, a log write that
+        #  hits a full disk) must neither kill the worker nor fail the command
+        #  in flight, so it is logged and the rest still run
+        for listener in list(listeners):
+            try:
+                listener(*args)
+            except Exception:
+                log.exception("listener %r failed on %s", listener, self.port)
+
+
+class Radio(object):
+    """One CI-V address on a session."""
+
+    def __init__(self, session, address=DEFAULT_ADDRESS, controller=CONTROLLER_ADDRESS):
+        self.session = session
+        self.address = address
+        self.controller = controller
+
+    def submit(self, command, data=b"", timeout=None):
+        return self.session.submit(civ_frame.build_frame(command, data, self.address, self.controller), timeout)
+
+    def send(self, command, data=b"", timeout=None):
+        return self.submit(command, data, timeout).result()
+
+    def set_frequency(self, hz, timeout=None):
+        return self.session.submit(civ_frame.set_frequency_frame(hz, self.address, self.controller), timeout)
+
+    def read_frequency(self, timeout=None):
+        return self.session.submit(civ_frame.read_frequency_frame(self.address, self.controller), timeout)
+
+    def read_s_meter(self, timeout=None):
+        return self.session.submit(civ_frame.read_s_meter_frame(self.address, self.controller), timeout)
+
+
+class RadioManager(object):
+    """One session per serial port, shared by every radio on that port."""
+
+    def __init__(self, baudrate=DEFAULT_BAUDRATE):
+        self.baudrate = baudrate
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, port, baudrate=None):
+        with self._lock:
+            session = self._sessions.get(port)
+            if session is None:
+                session = RadioSession(port, baudrate or self.baudrate)
+                self._sessions[port] = session
+            return session.open()
+
+    def radio(self, port, address=DEFAULT_ADDRESS):
+        return self.session(port).radio(address)
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
@@ -0,0 +1,163 @@
+#  Band scan / frequency sweep.
+#  Steps one radio through a range or a channel list as fast as the bus allows:
+#  set-frequency commands are queued `depth` ahead on the session, so the next
+#  frame goes out the moment the previous ack lands, and nothing sleeps.  Each
+#  step can read the frequency or the S-meter back.  Results are kept in memory;
+#  steps the rig took go to the log as they complete (flushed every log_batch
+#  steps), so a scan can share its log with the poller and the records stay in
+#  time order.  A scan can be cancelled and resumed from the step it stopped at.
+#  A port error stops the scan, cancels what is still queued and is kept in .error.
+import threading
+import time
+from collections import deque, namedtuple
+
+from radio_session import RadioTimeout
+
+DEPTH = 4
+LOG_BATCH = 256
+READBACKS = (None, "frequency", "meter")
+
+ScanResult = namedtuple("ScanResult", "timestamp hz ok value frame")
+
+
+def frequency_range(start, stop, step):
+    """Hz values from start to stop inclusive, like range() but for a sweep."""
+    if step <= 0:
+        raise ValueError("step must be positive")
+    if stop < start:
+        step = -step
+    count = abs(stop - start) // abs(step) + 1
+    return [start + index * step for index in range(count)]
+
+
+class Scan(object):
+    """run() sweeps the channels in the calling thread, start() in a background one."""
+
+    def __init__(self, radio, channels, readback=None, log=None, depth=DEPTH, log_batch=LOG_BATCH):
+        if readback not in READBACKS:
+            raise ValueError("readback must be one of %r" % (READBACKS,))
+        self.radio = radio
+        self.channels = list(channels)
+        self.readback = readback
+        self.log = log  # FrequencyLogWriter for the readbacks, or None
+        self.depth = max(1, depth)
+        self.log_batch = log_batch
+        self.results = []
+        self.position = 0  # index of the next channel to set; resume() starts here
+        self.elapsed = 0.0
+        self.error = None  # what stopped the last run early, kept for wait()
+        self._cancel = threading.Event()
+        self._thread = None
+
+    @property
+    def done(self):
+        return self.position >= len(self.channels)
+
+    @property
+    def steps_per_second(self):
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+    def cancel(self):
+        self._cancel.set()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            #  cleared here, not in the thread, so a cancel() right after start() sticks
+            self._cancel.clear()
+            self.error = None
+            self._thread = threading.Thread(target=self._run_background, name="scan", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Join the background scan; re-raises the error that stopped it, if any."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def resume(self):
+        return self.start()
+
+    def run(self):
+        self._cancel.clear()
+        return self._sweep()
+
+    def _run_background(self):
+        try:
+            self._sweep()
+        except Exception:
+            pass  # kept in self.error for wait()
+
+    def _sweep(self):
+        self.error = None
+        started = time.monotonic()
+        pending = deque()  # (hz, set future, readback future) in bus order
+        unflushed = 0
+        try:
+            index = self.position
+            while True:
+                while index < len(self.channels) and len(pending) < self.depth and not self._cancel.is_set():
+                    pending.append(self._submit(self.channels[index]))
+                    index += 1
+                if not pending:
+                    break
+                #  on cancel nothing new is queued; what is already on the bus finishes
+                result = self._collect(*pending.popleft())
+                self.results.append(result)
+                self.position += 1
+                if self._write(result):
+                    unflushed += 1
+                    if unflushed >= self.log_batch:
+                        self.log.flush()
+                        unflushed = 0
+        except Exception as error:
+            #  e.g. the port went away; position stays at the failed step for
+            #  resume(), which sends the steps still queued here again
+            for _, set_future, readback_future in pending:
+                set_future.cancel()
+                if readback_future is not None:
+                    readback_future.cancel()
+            self.error = error
+            raise
+        finally:
+            if unflushed:
+                self.log.flush()
+            self.elapsed += time.monotonic() - started
+        return self
+
+    def _submit(self, hz):
+        set_future = self.radio.set_frequency(hz)
+        if self.readback == "frequency":
+            return hz, set_future, self.radio.read_frequency()
+        if self.readback == "meter":
+            return hz, set_future, self.radio.read_s_meter()
+        return hz, set_future, None
+
+    def _collect(self, hz, set_future, readback_future):
+        try:
+            ok = set_future.result().is_ok
+        except RadioTimeout:
+            ok = False
+        value, frame = None, b""
+        if readback_future is not None:
+            try:
+                reply = readback_future.result()
+            except RadioTimeout:
+                pass
+            else:
+                value = reply.frequency if self.readback == "frequency" else reply.level
+                frame = reply.raw
+        return ScanResult(time.time(), hz, ok, value, frame)
+
+    def _write(self, result):
+        #  only where the rig is known to be: the frequency it read back, or the
+        #  channel it acked; NG'd and timed out steps are left out
+        if self.log is None or not result.ok:
+            return False
+        hz = result.value if self.readback == "frequency" else result.hz
+        if hz is None:
+            return False
+        self.log.append(hz, result.frame, result.timestamp)
+        return True
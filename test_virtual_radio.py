@@ -0,0 +1,232 @@
+#  Regression tests for the send, parse and log paths, run against the virtual
+#  IC-7300 on a pty (Linux only):  python -m pytest -q
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import civ_frame
+from civ_parser import FrameParser, parse
+from frequency_log import FrequencyLogWriter, FrequencyLogReader
+from poller import FrequencyPoller
+from radio_config import RadioState
+from radio_session import RadioSession, RadioTimeout, SessionClosed
+from scan import Scan, frequency_range
+from virtual_radio import VirtualRadio
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pseudo-terminal")
+
+
+@pytest.fixture
+def radio():
+    with VirtualRadio(seed=1) as virtual, RadioSession(virtual.port) as session:
+        yield virtual, session.radio(virtual.address)
+
+
+def test_bcd_round_trip():
+    for hz in (0, 1, 3956000, 14074000, civ_frame.MAX_FREQUENCY):
+        assert civ_frame.decode_frequency(civ_frame.encode_frequency(hz)) == hz
+    assert civ_frame.encode_frequency(3956000) == bytes.fromhex("0060950300")
+
+
+def test_set_and_read_frequency(radio):
+    virtual, rig = radio
+    assert rig.set_frequency(7074000).result().is_ok
+    assert virtual.frequency == 7074000
+    assert rig.read_frequency().result().frequency == 7074000
+    assert rig.set_frequency(10).result().is_ng  # below the rig's range
+    assert rig.read_s_meter().result().level == virtual.s_meter
+
+
+def test_transceive_set_completes_on_echo(radio):
+    virtual, rig = radio
+    frame = civ_frame.set_frequency_frame(3573000, rig.address, command=civ_frame.SET_FREQUENCY_TRANSCEIVE)
+    assert rig.session.send(frame).raw == frame
+    assert rig.read_frequency().result().frequency == 3573000
+
+
+def test_failing_listener_keeps_the_session_alive(radio):
+    virtual, rig = radio
+    heard = []
+
+    def failing(frame):
+        heard.append(frame.frequency)
+        raise OSError("log disk full")
+    rig.session.listeners.append(failing)
+    virtual.turn_dial(7100000)
+    assert rig.read_frequency().result(1).frequency == 7100000
+    virtual.turn_dial(7200000)
+    assert rig.read_frequency().result(1).frequency == 7200000
+    assert heard and set(heard) <= {7100000, 7200000}
+
+
+def test_parser_drops_echo_and_resyncs():
+    reply = civ_frame.build_frame(civ_frame.READ_FREQUENCY, civ_frame.encode_frequency(3956000),
+                                  civ_frame.CONTROLLER_ADDRESS, civ_frame.DEFAULT_ADDRESS)
+    data = civ_frame.read_frequency_frame() + b"\x12\xfe\x34" + b"\xfe\xfe\x94\xfc" + reply
+    assert [frame.frequency for frame in parse(data)] == [3956000]
+    parser = FrameParser()
+    frames = []
+    for byte in data:  # one byte at a time, as a slow port hands them back
+        frames += parser.feed(bytes((byte,)))
+    assert frames == parse(data)
+
+
+def test_decode_csv_log(tmp_path):
+    decode_frequency = pytest.importorskip("decode_frequency")  # needs numpy
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frequency_save.csv")
+    timestamps, hz = decode_frequency.read_log(path)
+    assert len(hz) == len(timestamps) == 27
+    assert hz[0] == 3508000
+    for chunk_bytes in (1, 100, 4096):
+        chunked = decode_frequency.read_log(path, chunk_bytes)
+        assert (chunked[0] == timestamps).all() and (chunked[1] == hz).all()
+
+    #  an S-meter reply carries no frequency; lines whose timestamp a crash left
+    #  unreadable are dropped
+    meter = civ_frame.build_frame(civ_frame.READ_METER, bytes.fromhex("020120"),
+                                  civ_frame.CONTROLLER_ADDRESS, civ_frame.DEFAULT_ADDRESS)
+    with open(path, "rb") as csv_file:
+        first = csv_file.readline()
+    other = tmp_path / "frequency_save.csv"
+    other.write_bytes(first + b"2021-02-14 15:00:00.000001,%s\r\r\n\0\0\0\0\0,/ 0xfe\nbad,/ 0x1\n"
+                      % "".join("/ " + hex(byte) for byte in meter).encode())
+    timestamps, hz = decode_frequency.read_log(str(other))
+    assert list(hz) == [3508000, decode_frequency.NO_FREQUENCY]
+    assert str(timestamps[1]) == "2021-02-14T15:00:00.000001"
+
+
+def test_noisy_link(radio):
+    virtual, rig = radio
+    virtual.noise = 1.0
+    futures = [rig.read_frequency() for _ in range(50)]
+    assert all(future.result().frequency == virtual.frequency for future in futures)
+
+
+def test_recovers_after_timeout():
+    with VirtualRadio(baudrate=1200) as virtual, RadioSession(virtual.port) as session:
+        rig = session.radio(virtual.address)
+        with pytest.raises(RadioTimeout):
+            rig.read_frequency(timeout=.05).result()
+        #  the late reply must not be taken as the answer to what comes next
+        for hz in (7000000, 7100000):
+            assert rig.set_frequency(hz).result().is_ok
+            assert rig.read_frequency().result().frequency == hz
+
+
+def test_closed_session_stays_closed():
+    with VirtualRadio() as virtual:
+        session = RadioSession(virtual.port).open()
+        rig = session.radio(virtual.address)
+        assert rig.read_frequency().result().frequency == virtual.frequency
+        session.close()
+        with pytest.raises(SessionClosed):
+            rig.read_frequency()
+        assert not [thread for thread in threading.enumerate() if thread.name.startswith("civ-")]
+
+
+def test_scan_cancel_and_resume(radio):
+    virtual, rig = radio
+    channels = frequency_range(7000000, 7100000, 1000)
+    scan = Scan(rig, channels, readback="frequency").start()
+    scan.cancel()  # right after start(): at most what was already queued goes out
+    scan.wait()
+    assert scan.position <= scan.depth and not scan.done
+    scan.resume().wait()
+    assert scan.done and [result.hz for result in scan.results] == channels
+    assert all(result.ok and result.value == result.hz for result in scan.results)
+    assert virtual.frequency == channels[-1]
+
+
+def test_scan_wait_raises_port_error():
+    virtual = VirtualRadio().start()
+    with RadioSession(virtual.port) as session:
+        virtual.stop()  # the port goes away under the session
+        scan = Scan(session.radio(virtual.address), frequency_range(7000000, 7010000, 1000)).start()
+        with pytest.raises(Exception) as raised:
+            scan.wait()
+        assert raised.value is scan.error and scan.position == 0
+
+
+def test_scan_logs_only_steps_the_rig_took(radio, tmp_path):
+    virtual, rig = radio
+    path = str(tmp_path / "scan.civlog")
+    with FrequencyLogWriter(path) as log:
+        scan = Scan(rig, [7000000, 10, 7100000], readback="frequency", log=log).run()
+    assert [result.ok for result in scan.results] == [True, False, True]
+    assert scan.results[1].value == 7000000  # the rig stayed where it was
+    with FrequencyLogReader(path) as reader:
+        assert [record.hz for record in reader] == [7000000, 7100000]
+
+
+def test_log_round_trip(tmp_path):
+    path = str(tmp_path / "test.civlog")
+    frame = civ_frame.set_frequency_frame(7074000)
+    with FrequencyLogWriter(path) as log:
+        for second in range(100):
+            log.append(7000000 + second, frame, 1000.0 + second)
+    with FrequencyLogReader(path) as reader:
+        assert len(reader) == 100
+        assert reader[0] == (1000.0, 7000000, frame)
+        assert [record.hz for record in reader.between(1010.0, 1013.0)] == [7000010, 7000011, 7000012]
+        assert reader.latest().hz == 7000099
+
+
+def test_writer_refuses_other_files(tmp_path):
+    path = tmp_path / "frequency_save.csv"
+    path.write_text("2021-02-14 14:51:42.527618,/ 0xfe/ 0xfe/ 0x94\n")
+    with pytest.raises(ValueError):
+        FrequencyLogWriter(str(path))
+    assert path.read_text().endswith("0x94\n")
+
+
+def test_state_loads_lazily_and_writes_only_changes(tmp_path):
+    path = tmp_path / "radio_state.json"
+    state = RadioState(str(path))
+    path.write_text(json.dumps({"mode": "read", "target_frequency": 7074000, "stray": 1}))  # after, not at, creation
+    assert state.mode == "read" and state.target_frequency == 7074000 and state.port == "COM4"
+    assert "stray" not in state.as_dict()
+    written = path.read_text()
+    assert state.update(mode="read", target_frequency="7074000") == {}
+    assert path.read_text() == written
+
+
+def test_state_replaces_the_file_atomically(tmp_path, monkeypatch):
+    path = tmp_path / "radio_state.json"
+    state = RadioState(str(path))
+    heard = []
+    state.subscribe(lambda state, changed: heard.append(changed))
+    assert state.update(mode="send", target_frequency=7000000) == {"target_frequency": 7000000}
+    assert heard == [{"target_frequency": 7000000}]
+    assert json.loads(path.read_text())["target_frequency"] == 7000000
+
+    def failing_dump(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(json, "dump", failing_dump)
+    with pytest.raises(OSError):
+        state.update(target_frequency=7100000)
+    assert json.loads(path.read_text())["target_frequency"] == 7000000
+    assert os.listdir(str(tmp_path)) == ["radio_state.json"]  # no temporary file left behind
+    assert heard == [{"target_frequency": 7000000}]
+
+
+def test_gui_reverts_a_rejected_target(radio, tmp_path):
+    frequency_gui = pytest.importorskip("frequency_gui")  # needs cherrypy
+    virtual, rig = radio
+    state = RadioState(str(tmp_path / "radio_state.json"))
+    poller = FrequencyPoller(rig).start()
+    try:
+        frequency_gui.index(rig, poller, state=state)
+        state.update(target_frequency=7074000)
+        deadline = time.monotonic() + 2
+        while (poller.latest is None or poller.latest.hz != 7074000) and time.monotonic() < deadline:
+            poller.wake()
+            time.sleep(.01)
+        state.update(target_frequency=10)  # NG from the rig
+        while state.target_frequency == 10 and time.monotonic() < deadline:
+            time.sleep(.01)
+        assert state.target_frequency == 7074000 and virtual.frequency == 7074000
+    finally:
+        poller.stop()
@@ -1,6 +1,8 @@
-import csv
-from radio_variables_1 import radio
-radio = 0
-with open("changable_var.csv", "a") as radio_read_write_csv:
-    write = csv.writer(radio_read_write_csv)
-    write.writerow(["radio", radio])
\ No newline at end of file
+#  The radio mode used to be appended to changable_var.csv every time this module
+#  was imported; it now lives in radio_config and is only written when it changes.
+from radio_config import get_state, SEND, READ
+
+
+def set_radio(radio):
+    """radio = 1 to send the frequency, 0 to read it, as in radio_variables_1."""
+    return get_state().update(mode=SEND if radio else READ)
@@ -0,0 +1,135 @@
+#  A simulated IC-7300 on a Linux pseudo-terminal, so the session, parser, poller
+#  and scanner can be run and measured without a rig on COM4.
+#  It echoes every byte back like the real CI-V bus, answers set frequency
+#  (0x05, OK/NG), read frequency (0x03) and the S-meter (0x15 0x02), silently
+#  takes transceive sets (0x00), and NGs anything else addressed to it.  Output
+#  can be paced to a baud rate (10 bit times per byte) and noise can be injected
+#  between frames.
+import os
+import random
+import select
+import threading
+import time
+import tty
+
+import civ_frame
+from civ_parser import FrameParser
+
+MIN_FREQUENCY = 30000
+MAX_FREQUENCY = 74800000
+
+
+class VirtualRadio(object):
+    """start() opens the pty; point a RadioSession at .port."""
+
+    def __init__(self, address=civ_frame.DEFAULT_ADDRESS, frequency=3956000, baudrate=None,
+                 noise=0.0, drop=0.0, seed=None):
+        self.address = address
+        self.frequency = frequency
+        self.s_meter = 120
+        self.baudrate = baudrate  # None answers as fast as the pty allows
+        self.noise = noise  # chance of a burst of garbage before each reply
+        self.drop = drop  # chance of not answering at all
+        self.commands = 0
+        self.port = None
+        self._random = random.Random(seed)
+        self._parser = FrameParser(drop_echo=False)
+        self._master = self._slave = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._write_lock = threading.Lock()
+
+    def start(self):
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="virtual-radio", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        os.close(self._master)
+        os.close(self._slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def turn_dial(self, hz):
+        """Change frequency from the front panel; broadcasts a transceive frame."""
+        self.frequency = hz
+        self._send(civ_frame.set_frequency_frame(hz, 0x00, self.address, civ_frame.SET_FREQUENCY_TRANSCEIVE))
+
+    def _run(self):
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._master], [], [], .05)
+            if not ready:
+                continue
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                break
+            self._send(data)  # the bus echoes everything a controller sends
+            for frame in self._parser.feed(data):
+                if frame.to in (self.address, 0x00) and frame.sender != self.address:
+                    self._answer(frame)
+
+    def _answer(self, frame):
+        self.commands += 1
+        reply = self._reply(frame)
+        if reply is None or self._random.random() < self.drop:
+            return
+        if self.noise and self._random.random() < self.noise:
+            reply = bytes(self._random.randrange(256) for _ in range(self._random.randint(1, 8))) + reply
+        self._send(reply)
+
+    def _reply(self, frame):
+        address, controller = frame.sender, self.address
+
+        def ack(ok):
+            return civ_frame.build_frame(civ_frame.OK if ok else civ_frame.NG, b"", address, controller)
+
+        if frame.command in (civ_frame.SET_FREQUENCY, civ_frame.SET_FREQUENCY_TRANSCEIVE):
+            try:
+                hz = civ_frame.decode_frequency(frame.data)
+            except ValueError:
+                hz = None
+            ok = len(frame.data) == civ_frame.FREQUENCY_BYTES and hz is not None and MIN_FREQUENCY <= hz <= MAX_FREQUENCY
+            if ok:
+                self.frequency = hz
+            return ack(ok) if frame.command == civ_frame.SET_FREQUENCY else None
+        if frame.command == civ_frame.READ_FREQUENCY and not frame.data:
+            return civ_frame.build_frame(civ_frame.READ_FREQUENCY, civ_frame.encode_frequency(self.frequency),
+                                         address, controller)
+        if frame.command == civ_frame.READ_METER and frame.data == bytes((civ_frame.S_METER,)):
+            level = bytes.fromhex("%04d" % self.s_meter)
+            return civ_frame.build_frame(civ_frame.READ_METER, bytes((civ_frame.S_METER,)) + level,
+                                         address, controller)
+        return ack(False)
+
+    def _send(self, data):
+        with self._write_lock:
+            self._pace(len(data))
+            os.write(self._master, data)
+
+    def _pace(self, count):
+        if self.baudrate:
+            time.sleep(count * 10.0 / self.baudrate)
+
+
+if __name__ == "__main__":
+    with VirtualRadio() as radio:
+        print("virtual IC-7300 (0x%02x) on %s, ctrl-c to stop" % (radio.address, radio.port))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass